@@ -101,26 +101,18 @@ class App extends Component {
   }
 
 
-  async getProducts(){
-    let response = await fetch('/api/products/', {
-      headers: {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json',
-      }
-    });
-
-    if (!response.ok){
+  async getStorefront(){
+    let initialState = document.getElementById('initial-state');
+    if (initialState){
+      let data = JSON.parse(initialState.textContent);
+      this.setState({
+        products : data.products,
+        banners : data.banners,
+      });
       return;
     }
 
-    let data = await response.json();
-    this.setState({
-      products : data
-    });
-  }
-
-  async getBanners(){
-    let response = await fetch('/api/banners/', {
+    let response = await fetch('/api/bootstrap/', {
       headers: {
         'Accept': 'application/json',
         'Content-Type': 'application/json',
@@ -133,13 +125,13 @@ class App extends Component {
 
     let data = await response.json();
     this.setState({
-      banners : data
+      products : data.products,
+      banners : data.banners,
     });
   }
 
   componentDidMount(){
-    this.getProducts();
-    this.getBanners();
+    this.getStorefront();
   }
 
 
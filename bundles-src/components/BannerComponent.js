@@ -11,9 +11,13 @@ const BannerComponent = (props) => {
   };
 
   let carousel_items = props.banners.map( (cfg, index) => {
+    let srcSet = (cfg.src_variants || [])
+      .filter(variant => variant.format === 'webp')
+      .map(variant => `${variant.url} ${variant.width}w`)
+      .join(', ');
     return (
       <div className={index ? 'item' : 'item active'} key={index}>
-        <img src={cfg.src} alt={cfg.title} style={bannerStyle}/>
+        <img src={cfg.src} srcSet={srcSet || undefined} sizes="100vw" alt={cfg.title} style={bannerStyle}/>
         <div className="carousel-caption">
           <h3>{cfg.title}</h3>
           <p>{cfg.text}</p>
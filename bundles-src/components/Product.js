@@ -39,13 +39,17 @@ class Product extends Component{
 
   render(){
     let image = this.props.product.image;
+    let imageSrcSet = (this.props.product.image_variants || [])
+      .filter(variant => variant.format === 'webp')
+      .map(variant => `${variant.url} ${variant.width}w`)
+      .join(', ');
     let name = this.props.product.name;
     let price = this.props.product.price;
     let id = this.props.product.id;
     return (
       <div className="product">
         <div className="product-image">
-          <img src={image} alt={name} onClick={this.quickView.bind(this)}/>
+          <img src={image} srcSet={imageSrcSet || undefined} sizes="320px" alt={name} onClick={this.quickView.bind(this)}/>
         </div>
         <h4 className="product-name">{name}</h4>
         <p className="product-price currency">{price}</p>
@@ -1,6 +1,7 @@
 from adminsortable2.admin import SortableAdminMixin
 from django.conf import settings
 from django.contrib import admin
+from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 from django.templatetags.static import static
@@ -8,6 +9,8 @@ from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.timezone import now
 
+from .api_cache import invalidate_api_cache
+from .geo_services import run_in_background
 from .models import Product, ProductInCart, Order, Banner
 from .models import ProductCategory
 from .models import Restaurant
@@ -62,6 +65,12 @@ class BannerAdmin(PreviewAdminMixin, SortableAdminMixin, admin.ModelAdmin):
     ]
     ordering = ['order']
 
+    def _update_order(self, updated_items, extra_model_filters):
+        # Перетаскивание баннеров сохраняется через bulk_update, который не шлёт сигналов
+        updated_count = super()._update_order(updated_items, extra_model_filters)
+        transaction.on_commit(lambda: invalidate_api_cache('banners'))
+        return updated_count
+
 
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
@@ -78,6 +87,16 @@ class RestaurantAdmin(admin.ModelAdmin):
     inlines = [
         RestaurantMenuItemInline
     ]
+    readonly_fields = [
+        'latitude',
+        'longitude',
+        'geohash',
+    ]
+
+    def save_model(self, request, obj, form, change):
+        if 'address' in form.changed_data or obj.latitude is None:
+            obj.locate()
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(Product)
@@ -169,7 +188,8 @@ class OrderAdmin(admin.ModelAdmin):
     readonly_fields = [
         'created_at',
         'processed_at',
-        'finished_at'
+        'finished_at',
+        'total_cost'
     ]
     list_filter = [
         'status'
@@ -190,8 +210,17 @@ class OrderAdmin(admin.ModelAdmin):
             instance.status = 'PICKING'
         if not instance.finished_at and instance.status in ['CLOSED', 'CANCELED']:
             instance.finished_at = now()
+        if 'address' in form.changed_data:
+            instance.place = None
         return form.save(commit=False)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not obj.place_id:
+            transaction.on_commit(lambda: run_in_background(
+                Order.objects.filter(pk=obj.pk).link_places
+            ))
+
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
         for instance in instances:
@@ -199,6 +228,8 @@ class OrderAdmin(admin.ModelAdmin):
                 instance.price = instance.product.price
             instance.save()
         formset.save()
+        if formset.model is ProductInCart:
+            Order.objects.filter(pk=form.instance.pk).update_total_costs()
 
     def response_change(self, request, obj):
         response = super().response_change(request, obj)
@@ -212,7 +243,14 @@ class OrderAdmin(admin.ModelAdmin):
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'restaurant':
             order_id = request.resolver_match.kwargs['object_id']
-            order = Order.objects.filter(pk=order_id).get_available_restaurants().first()
+            order = Order.objects.filter(pk=order_id).select_related('place'). \
+                get_available_restaurants(). \
+                get_distances_to_client(). \
+                first()
             available_restaurants_ids = {restaurant.id for restaurant in order.available_restaurants}
+            # Уже назначенный ресторан может не попасть в ближайшие, но из списка пропасть
+            # не должен, иначе любое сохранение заказа молча снимет назначение
+            if order.restaurant_id:
+                available_restaurants_ids.add(order.restaurant_id)
             kwargs['queryset'] = Restaurant.objects.filter(pk__in=available_restaurants_ids)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
@@ -0,0 +1,42 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.core.cache import cache, caches
+from django.utils.timezone import now
+from django.views.decorators.http import condition
+
+
+def get_api_version(scope):
+    # Версия и время последнего изменения данных, из которых собран ответ API
+    version = cache.get(f'foodcartapp:api_version:{scope}')
+    if version is None:
+        version = invalidate_api_cache(scope)
+    return version
+
+
+def invalidate_api_cache(scope):
+    version = uuid4().hex, now()
+    cache.set(f'foodcartapp:api_version:{scope}', version, timeout=None)
+    return version
+
+
+def get_or_build_api_payload(scope, build_payload, key=''):
+    version, _ = get_api_version(scope)
+    payload_key = f'foodcartapp:api_payload:{scope}:{version}:{md5(key.encode()).hexdigest()}'
+    # Сами ответы лежат в отдельном кэше: их вытеснение не должно сбрасывать версии
+    payload = caches['fragments'].get(payload_key)
+    if payload is None:
+        payload = build_payload()
+        caches['fragments'].set(payload_key, payload, timeout=None)
+    return payload
+
+
+def api_condition(*scopes):
+    # ETag и Last-Modified берутся из версий данных, так что повторный клиент получит 304
+    def get_etag(request, *args, **kwargs):
+        return '-'.join(get_api_version(scope)[0] for scope in scopes)
+
+    def get_last_modified(request, *args, **kwargs):
+        return max(get_api_version(scope)[1] for scope in scopes)
+
+    return condition(etag_func=get_etag, last_modified_func=get_last_modified)
@@ -0,0 +1,67 @@
+from collections import defaultdict
+from uuid import uuid4
+
+from django.apps import apps
+from django.core.cache import cache
+
+VERSION_CACHE_KEY = 'foodcartapp:availability_index_version'
+
+_index = None
+
+
+class AvailabilityIndex:
+    # Для каждого товара хранит битовую маску ресторанов, где он есть в продаже.
+    # Рестораны, способные приготовить заказ целиком, — это AND масок его товаров
+    def __init__(self, menu_items, version):
+        self.version = version
+        self.restaurants_ids = sorted({restaurant_id for restaurant_id, _ in menu_items})
+        restaurants_bits = {
+            restaurant_id: 1 << bit
+            for bit, restaurant_id in enumerate(self.restaurants_ids)
+        }
+        self.products_masks = defaultdict(int)
+        for restaurant_id, product_id in menu_items:
+            self.products_masks[product_id] |= restaurants_bits[restaurant_id]
+
+    def find_capable_restaurants(self, products_ids):
+        if not products_ids:
+            return []
+
+        mask = (1 << len(self.restaurants_ids)) - 1
+        for product_id in products_ids:
+            mask &= self.products_masks.get(product_id, 0)
+
+        restaurants_ids = []
+        while mask:
+            lowest_bit = mask & -mask
+            restaurants_ids.append(self.restaurants_ids[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return restaurants_ids
+
+
+def get_availability_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = invalidate_availability_index()
+    return version
+
+
+def get_availability_index():
+    global _index
+    version = get_availability_version()
+    if _index is None or _index.version != version:
+        RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+        menu_items = list(
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .values_list('restaurant', 'product')
+        )
+        _index = AvailabilityIndex(menu_items, version)
+    return _index
+
+
+def invalidate_availability_index():
+    # Версия лежит в общем кэше, так что индекс перестроят все воркеры, а не только текущий
+    version = uuid4().hex
+    cache.set(VERSION_CACHE_KEY, version, timeout=None)
+    return version
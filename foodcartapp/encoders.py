@@ -0,0 +1,20 @@
+from decimal import Decimal
+
+import orjson
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+
+
+def encode_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, FieldFile):
+        return value.url if value else None
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+def dump_json(data) -> bytes:
+    # В проде отдаём компактный JSON, с отступами — только для отладки
+    options = orjson.OPT_INDENT_2 if settings.API_PRETTY_JSON else 0
+    return orjson.dumps(data, default=encode_value, option=options)
+
@@ -1,44 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
 import requests
+from django.apps import apps
 from django.conf import settings
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
 from django.utils.timezone import now
-from requests.exceptions import HTTPError, JSONDecodeError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import JSONDecodeError, RequestException
+
+from geopy.distance import distance
 
 from places.models import Place
 
 _lat = float
 _lon = float
 
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+PLACE_TTL = timedelta(days=1)
+PLACE_REFRESH_AHEAD = timedelta(hours=1)
+FETCH_RETRY_BACKOFF = timedelta(minutes=5)
+FETCH_RETRY_MAX_BACKOFF = timedelta(days=7)
+
+_background_executor = ThreadPoolExecutor(max_workers=1)
+
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_maxsize=settings.GEOCODER_MAX_WORKERS
+))
+
 
 def _get_places(addresses):
+    # Устаревшие координаты отдаём как есть, их обновляет команда refresh_places.
+    # Адреса, которые не удалось геокодировать, тоже повторяет только она
     geocoder_api_key = settings.GEOCODER_API_KEY
+    addresses = set(addresses)
+
+    known_places = Place.objects.in_bulk(addresses)
+    new_addresses = [address for address in addresses if address not in known_places]
+    fetched_coordinates = _fetch_many_coordinates(geocoder_api_key, new_addresses)
+
+    new_places = [Place(address=address) for address in new_addresses]
+    for place in new_places:
+        _apply_fetched_coordinates(place, fetched_coordinates[place.address])
+        known_places[place.address] = place
+    Place.objects.bulk_create(new_places, ignore_conflicts=True)
 
     places = dict()
-    for address in addresses:
-        place, place_created = Place.objects.get_or_create(address=address)
-        timedelta_after_last_update = now() - place.updated_at
-
-        if place_created or timedelta_after_last_update.days > 0:
-            try:
-                longitude, latitude = _fetch_coordinates(geocoder_api_key, address)
-            except (HTTPError, JSONDecodeError, KeyError, TypeError):
-                places[address] = False
-                continue
-            else:
-                place.latitude = latitude
-                place.longitude = longitude
-                place.save()
-
-        places[address] = place.latitude, place.longitude
+    for address, place in known_places.items():
+        if place.latitude is None or place.longitude is None:
+            places[address] = False
+        else:
+            places[address] = place.latitude, place.longitude
     return places
 
 
+def run_in_background(func, *args):
+    def run():
+        try:
+            func(*args)
+        finally:
+            connections.close_all()
+
+    _background_executor.submit(run)
+
+
+def get_expiring_places(limit):
+    # Обновляем только то, что ещё нужно: адреса активных заказов и ресторанов.
+    # Адреса давно закрытых заказов геокодер больше не тратят
+    Order = apps.get_model('foodcartapp', 'Order')
+    Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+    active_orders = Order.objects.filter(place=OuterRef('pk'), status__in=Order.ACTIVE_STATUSES)
+
+    expires_before = now() - PLACE_TTL + PLACE_REFRESH_AHEAD
+    return (
+        Place.objects
+        .filter(
+            Q(updated_at__lt=expires_before, retry_after__isnull=True)
+            | Q(retry_after__lte=now())
+        )
+        .filter(
+            Q(Exists(active_orders))
+            | Q(address__in=Restaurant.objects.values('address'))
+        )
+        .order_by('updated_at')[:limit]
+    )
+
+
+def refresh_places(places):
+    places = list(places)
+    fetched_coordinates = _fetch_many_coordinates(
+        settings.GEOCODER_API_KEY,
+        [place.address for place in places]
+    )
+
+    refreshed_places = []
+    for place in places:
+        if _apply_fetched_coordinates(place, fetched_coordinates[place.address]):
+            refreshed_places.append(place)
+
+    Place.objects.bulk_update(places, [
+        'latitude',
+        'longitude',
+        'updated_at',
+        'fetch_error',
+        'fetch_attempts',
+        'retry_after',
+    ])
+    return refreshed_places
+
+
+def _apply_fetched_coordinates(place, fetched_coordinates):
+    if fetched_coordinates is None:
+        _mark_failed(place, 'REQUEST')
+        return False
+    if not fetched_coordinates:
+        _mark_failed(place, 'NOT_FOUND')
+        return False
+
+    place.longitude, place.latitude = fetched_coordinates
+    place.updated_at = now()
+    place.fetch_error = ''
+    place.fetch_attempts = 0
+    place.retry_after = None
+    return True
+
+
+def _mark_failed(place, fetch_error):
+    # Старые координаты не трогаем: пусть лучше покажутся устаревшие, чем никакие
+    place.fetch_error = fetch_error
+    place.fetch_attempts += 1
+    backoff = min(FETCH_RETRY_BACKOFF * 2 ** (place.fetch_attempts - 1), FETCH_RETRY_MAX_BACKOFF)
+    place.retry_after = now() + backoff
+
+
+def _fetch_many_coordinates(apikey: str, addresses) -> dict[str, tuple[_lon, _lat] | list | None]:
+    if not addresses:
+        return {}
+
+    # Для адресов, которые не удалось геокодировать из-за ошибки запроса, вернётся None
+    def fetch(address):
+        try:
+            return _fetch_coordinates(apikey, address)
+        except (RequestException, JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+
+    max_workers = min(settings.GEOCODER_MAX_WORKERS, len(addresses))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(addresses, executor.map(fetch, addresses)))
+
+
 def _fetch_coordinates(apikey: str, address: str) -> tuple[_lon, _lat] | list:
     base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
+    response = _session.get(base_url, params={
         "geocode": address,
         "apikey": apikey,
         "format": "json",
-    })
+    }, timeout=settings.GEOCODER_TIMEOUT)
     response.raise_for_status()
     found_places = response.json()['response']['GeoObjectCollection']['featureMember']
 
@@ -48,3 +170,56 @@ def _fetch_coordinates(apikey: str, address: str) -> tuple[_lon, _lat] | list:
     most_relevant, *_ = found_places
     lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
     return float(lon), float(lat)
+
+
+# Расстояния в километрах между всеми парами точек (широта, долгота).
+# По умолчанию считаются по формуле гаверсинусов одним векторным проходом,
+# с geodesic=True — точнее, по эллипсоиду через geopy, но попарно и медленно
+def get_distance_matrix(origins, destinations, geodesic=None) -> np.ndarray:
+    if geodesic is None:
+        geodesic = settings.DISTANCE_GEODESIC
+
+    if geodesic:
+        return np.array([
+            [distance(origin, destination).km for destination in destinations]
+            for origin in origins
+        ]).reshape(len(origins), len(destinations))
+
+    origins = np.radians(np.array(origins, dtype=float).reshape(-1, 2))
+    destinations = np.radians(np.array(destinations, dtype=float).reshape(-1, 2))
+    origin_lats = origins[:, 0, np.newaxis]
+    origin_lons = origins[:, 1, np.newaxis]
+    destination_lats = destinations[np.newaxis, :, 0]
+    destination_lons = destinations[np.newaxis, :, 1]
+
+    haversine = (
+        np.sin((destination_lats - origin_lats) / 2) ** 2
+        + np.cos(origin_lats) * np.cos(destination_lats)
+        * np.sin((destination_lons - origin_lons) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(haversine))
+
+
+def encode_geohash(latitude: _lat, longitude: _lon, precision=9) -> str:
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bits_count = 0
+    even_bit = True
+    while len(geohash) < precision:
+        value, value_range = (longitude, longitude_range) if even_bit else (latitude, latitude_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even_bit = not even_bit
+        bits_count += 1
+        if bits_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bits_count = 0
+    return ''.join(geohash)
@@ -0,0 +1,55 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+VARIANT_WIDTHS = [320, 640, 1280]
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+
+def generate_image_variants(image_file):
+    # Уменьшенные и пережатые копии картинки для витрины, оригиналы бывают по несколько мегабайт
+    image_file.open('rb')
+    with Image.open(image_file) as image:
+        image.load()
+    image_file.close()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] or [image.width]
+    stem, _ = os.path.splitext(image_file.name)
+
+    variants = []
+    for width in widths:
+        height = round(image.height * width / image.width)
+        resized_image = image.resize((width, height), Image.LANCZOS)
+        for extension, save_options in VARIANT_FORMATS.items():
+            variant_image = resized_image
+            if save_options['format'] == 'JPEG' and variant_image.mode != 'RGB':
+                variant_image = variant_image.convert('RGB')
+            buffer = BytesIO()
+            variant_image.save(buffer, **save_options)
+
+            name = f'variants/{stem}_{width}w.{extension}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            variants.append({'width': width, 'format': extension, 'name': name})
+
+    return {'source': image_file.name, 'variants': variants}
+
+
+def dump_image_variants(image_variants):
+    return [
+        {
+            'width': variant['width'],
+            'format': variant['format'],
+            'url': default_storage.url(variant['name']),
+        }
+        for variant in image_variants.get('variants', [])
+    ]
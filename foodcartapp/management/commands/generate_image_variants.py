@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.api_cache import invalidate_api_cache
+from foodcartapp.images import generate_image_variants
+from foodcartapp.models import Banner, Product
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок товаров и баннеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии даже для картинок, у которых они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').only('id', 'image', 'image_variants')
+        for product in products.iterator():
+            if not options['force'] and product.image_variants.get('source') == product.image.name:
+                continue
+            try:
+                product.image_variants = generate_image_variants(product.image)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Товар {product.id}: {error}')
+                continue
+            product.save(update_fields=['image_variants'])
+            self.stdout.write(f'Товар {product.id}: {len(product.image_variants["variants"])} копий')
+
+        banners = Banner.objects.exclude(src='').only('id', 'src', 'src_variants')
+        for banner in banners.iterator():
+            if not options['force'] and banner.src_variants.get('source') == banner.src.name:
+                continue
+            try:
+                banner.src_variants = generate_image_variants(banner.src)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Баннер {banner.id}: {error}')
+                continue
+            banner.save(update_fields=['src_variants'])
+            self.stdout.write(f'Баннер {banner.id}: {len(banner.src_variants["variants"])} копий')
+
+        invalidate_api_cache('catalog')
+        invalidate_api_cache('banners')
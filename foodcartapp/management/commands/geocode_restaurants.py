@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет координаты ресторанов в их записях'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Геокодировать заново все рестораны, а не только те, у которых нет координат',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all()
+        if not options['all']:
+            restaurants = restaurants.filter(latitude__isnull=True)
+
+        restaurants = restaurants.locate()
+        located_count = sum(restaurant.latitude is not None for restaurant in restaurants)
+        self.stdout.write(f'Найдены координаты ресторанов: {located_count} из {len(restaurants)}')
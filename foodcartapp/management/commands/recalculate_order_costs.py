@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённую стоимость заказов по товарам в корзине'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только найти заказы с неверной стоимостью, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatched_orders = (
+                Order.objects
+                .calculate_costs()
+                .exclude(total_cost=F('cost'))
+                .values_list('id', 'total_cost', 'cost')
+            )
+            for order_id, total_cost, cost in mismatched_orders:
+                self.stdout.write(f'Заказ {order_id}: сохранено {total_cost}, по корзине {cost}')
+            self.stdout.write(f'Заказов с неверной стоимостью: {len(mismatched_orders)}')
+            return
+
+        updated_count = Order.objects.update_total_costs()
+        self.stdout.write(f'Пересчитана стоимость заказов: {updated_count}')
@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from foodcartapp.geo_services import get_expiring_places, refresh_places
+from foodcartapp.models import Order, OrderEvent
+
+ORDER_EVENTS_TTL = timedelta(days=1)
+
+
+class Command(BaseCommand):
+    help = 'Обновляет координаты мест, у которых скоро истечёт срок годности, и чистит старые события заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Сколько мест обновлять за один проход',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Пауза между проходами в секундах',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Сделать один проход и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            places = get_expiring_places(options['batch_size'])
+            if places:
+                refreshed_places = refresh_places(places)
+                self.stdout.write(f'Обновлено мест: {len(refreshed_places)} из {len(places)}')
+                # С новыми координатами у заказа поменяются рестораны и расстояния,
+                # так что строки этих заказов на странице менеджера надо пересобрать
+                Order.objects.filter(
+                    place__in=refreshed_places,
+                    status__in=Order.ACTIVE_STATUSES
+                ).update(updated_at=now())
+
+            # Подбираем заказы, которые не успели геокодировать при создании
+            orders = Order.objects.filter(place__isnull=True).filter_active()[:options['batch_size']]
+            if orders:
+                linked_orders = orders.link_places()
+                self.stdout.write(f'Геокодировано заказов: {len(linked_orders)}')
+
+            # Старые события заказов нужны только для переподключения потока на странице заказов
+            OrderEvent.objects.filter(created_at__lt=now() - ORDER_EVENTS_TTL).delete()
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
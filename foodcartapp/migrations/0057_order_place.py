@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-18 02:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0006_alter_place_address'),
+        ('foodcartapp', '0056_rename_delivered_at_order_finished_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='place',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='places.place', verbose_name='Место доставки'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 02:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0061_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CREATED', 'Заказ создан'), ('STATUS_CHANGED', 'Сменился статус')], max_length=20, verbose_name='Событие')),
+                ('status', models.CharField(choices=[('NEW', 'Необработан'), ('PICKING', 'Сборка'), ('DELIVERING', 'Доставка'), ('CLOSED', 'Завершён'), ('CANCELED', 'Отменён')], max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Создано')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='foodcartapp.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Событие заказа',
+                'verbose_name_plural': 'События заказов',
+                'ordering': ['id'],
+            },
+        ),
+    ]
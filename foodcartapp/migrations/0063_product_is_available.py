@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0062_orderevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_available',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='есть в продаже'),
+        ),
+    ]
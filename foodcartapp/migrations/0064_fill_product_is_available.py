@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def fill_is_available(apps, schema_editor):
+    Product = apps.get_model('foodcartapp', 'Product')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+    Product.objects.update(is_available=Exists(
+        RestaurantMenuItem.objects.filter(product=OuterRef('pk'), availability=True)
+    ))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('foodcartapp', '0063_product_is_available'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_is_available, migrations.RunPython.noop)
+    ]
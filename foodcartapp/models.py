@@ -1,13 +1,29 @@
-from copy import deepcopy
+from collections import defaultdict
+from decimal import Decimal
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.db.models import QuerySet, Sum, F
+from django.db.models import QuerySet, Sum, F, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now
-from geopy.distance import distance
 from phonenumber_field.modelfields import PhoneNumberField
 
-from foodcartapp.geo_services import _get_places
+from foodcartapp.availability_index import get_availability_index
+from foodcartapp.geo_services import _get_places, encode_geohash
+from foodcartapp.restaurants_index import get_restaurants_index, invalidate_restaurants_index
+from places.models import Place
+
+
+class RestaurantQuerySet(models.QuerySet):
+    def locate(self):
+        restaurants = list(self)
+        places = _get_places({restaurant.address for restaurant in restaurants if restaurant.address})
+        for restaurant in restaurants:
+            restaurant.locate(places)
+        Restaurant.objects.bulk_update(restaurants, ['latitude', 'longitude', 'geohash'])
+        # bulk_update не шлёт сигналов, так что индекс ресторанов сбрасываем сами
+        transaction.on_commit(invalidate_restaurants_index)
+        return restaurants
 
 
 class Restaurant(models.Model):
@@ -25,6 +41,16 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    latitude = models.FloatField('широта', blank=True, null=True)
+    longitude = models.FloatField('долгота', blank=True, null=True)
+    geohash = models.CharField(
+        'геохеш',
+        max_length=12,
+        blank=True,
+        db_index=True,
+    )
+
+    objects = RestaurantQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'ресторан'
@@ -33,15 +59,29 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def locate(self, places=None):
+        if places is None:
+            places = _get_places([self.address]) if self.address else {}
+        coordinates = places.get(self.address)
+        if coordinates:
+            self.latitude, self.longitude = coordinates
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.latitude = self.longitude = None
+            self.geohash = ''
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
-        )
-        return self.filter(pk__in=products)
+        return self.filter(Exists(
+            RestaurantMenuItem.objects.filter(product=OuterRef('pk'), availability=True)
+        ))
+
+    def update_availability(self):
+        # Поле is_available дублирует available(), чтобы витрина обходилась одним индексом
+        return self.update(is_available=Exists(
+            RestaurantMenuItem.objects.filter(product=OuterRef('pk'), availability=True)
+        ))
 
 
 class ProductCategory(models.Model):
@@ -80,11 +120,23 @@ class Product(models.Model):
     image = models.ImageField(
         'картинка'
     )
+    image_variants = models.JSONField(
+        'уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     special_status = models.BooleanField(
         'спец.предложение',
         default=False,
         db_index=True,
     )
+    is_available = models.BooleanField(
+        'есть в продаже',
+        default=False,
+        db_index=True,
+        editable=False,
+    )
     description = models.TextField(
         'описание',
         max_length=200,
@@ -130,6 +182,13 @@ class RestaurantMenuItem(models.Model):
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Если пункт меню перенесут на другой товар, пересчитать надо оба товара
+        instance.loaded_product_id = instance.__dict__.get('product_id')
+        return instance
+
 
 class ProductInCart(models.Model):
     product = models.ForeignKey(
@@ -165,70 +224,137 @@ class ProductInCart(models.Model):
         return f'Заказ {self.order}: {self.product} - {self.quantity}'
 
 
+class RestaurantCandidate:
+    # Ресторан, который может приготовить заказ. Сам ресторан общий для всех заказов
+    __slots__ = ('restaurant', 'distance_to_client')
+
+    def __init__(self, restaurant, distance_to_client=None):
+        self.restaurant = restaurant
+        self.distance_to_client = distance_to_client
+
+    @property
+    def id(self):
+        return self.restaurant.id
+
+    @property
+    def name(self):
+        return self.restaurant.name
+
+
 class OrderQuerySet(QuerySet):
     def calculate_costs(self):
-        self.prefetch_related('products_in_cart')
         return self.annotate(
-            cost=Sum(
-                F('products_in_cart__price') * F('products_in_cart__quantity')
+            cost=Coalesce(
+                Sum(F('products_in_cart__price') * F('products_in_cart__quantity')),
+                Decimal(0),
+                output_field=models.DecimalField(),
             ))
 
+    def update_total_costs(self):
+        # Стоимость заказа хранится в самом заказе, чтобы не пересчитывать её при каждом показе
+        orders_costs = (
+            ProductInCart.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(cost=Sum(F('price') * F('quantity')))
+            .values('cost')
+        )
+        # update() не трогает auto_now, а по updated_at сбрасывается кэш строки заказа
+        return self.update(
+            total_cost=Coalesce(
+                Subquery(orders_costs),
+                Decimal(0),
+                output_field=models.DecimalField(),
+            ),
+            updated_at=now(),
+        )
+
     def filter_active(self):
-        return self.filter(status__in=['NEW', 'PICKING', 'DELIVERING']). \
-            calculate_costs(). \
-            order_by('status', '-created_at')
+        return self.filter(status__in=Order.ACTIVE_STATUSES). \
+            select_related('place', 'restaurant'). \
+            order_by('status', '-created_at', '-id')
+
+    def filter_after(self, status, created_at, order_id):
+        # Продолжение выборки, упорядоченной как в filter_active, после заданного заказа
+        return self.filter(
+            Q(status__gt=status)
+            | Q(status=status, created_at__lt=created_at)
+            | Q(status=status, created_at=created_at, id__lt=order_id)
+        )
 
-    def get_available_restaurants(self):
-        orders_ids = (str(order.id) for order in self)
-        available_restaurants = super().raw(
-            """
-            SELECT pic.id, rmi.id, o.id ord_id, r.id res_id
-            FROM foodcartapp_order o
-            JOIN foodcartapp_productincart pic ON pic.order_id=o.id
-            JOIN foodcartapp_restaurantmenuitem rmi ON pic.product_id=rmi.product_id
-            JOIN foodcartapp_restaurant r ON rmi.product_id=r.id
-            WHERE o.id IN ({})
-            """.format(','.join(orders_ids))
-            # Пришлось использовать format. Джанговый плейсхолдер %s автоматически оборачивается в кавычки
+    def filter_until(self, status, created_at, order_id):
+        # Начало той же выборки вплоть до заданного заказа включительно
+        return self.filter(
+            Q(status__lt=status)
+            | Q(status=status, created_at__gt=created_at)
+            | Q(status=status, created_at=created_at, id__gte=order_id)
         )
-        restaurants = Restaurant.objects.all()
+
+    def get_available_restaurants(self):
+        orders_ids = [order.id for order in self]
+        orders_products_ids = defaultdict(set)
+        for order_id, product_id in (
+            ProductInCart.objects
+            .filter(order__in=orders_ids)
+            .values_list('order', 'product')
+        ):
+            orders_products_ids[order_id].add(product_id)
+
+        availability_index = get_availability_index()
+        orders_restaurants_ids = {
+            order_id: availability_index.find_capable_restaurants(products_ids)
+            for order_id, products_ids in orders_products_ids.items()
+        }
+        restaurants = Restaurant.objects.only('id', 'name'). \
+            in_bulk(set().union(*orders_restaurants_ids.values()))
+
         for order in self:
-            order_rests = filter(
-                lambda order_rest: order_rest.ord_id == order.id,
-                available_restaurants
-            )
-            order_restaurants_ids = [
-                order_rest.res_id
-                for order_rest in order_rests
-            ]
             order.available_restaurants = [
-                deepcopy(restaurant)
-                for restaurant in restaurants
-                if restaurant.id in order_restaurants_ids
+                RestaurantCandidate(restaurants[restaurant_id])
+                for restaurant_id in orders_restaurants_ids.get(order.id, [])
             ]
         return self
 
-    def get_distances_to_client(self):
-        restaurant_addresses = set()
-        for order in self:
-            for restaurant in order.available_restaurants:
-                restaurant_addresses.add(restaurant.address)
-        orders_addresses = {order.address for order in self}
-        all_places = _get_places(restaurant_addresses | orders_addresses)
+    def link_places(self):
+        orders = list(self)
+        _get_places({order.address for order in orders})
+        for order in orders:
+            order.place_id = order.address
+            order.updated_at = now()
+        Order.objects.bulk_update(orders, ['place', 'updated_at'])
+        return orders
 
+    def get_distances_to_client(self):
+        # Здесь только читаем готовые координаты. Заказы, которые ещё не успели геокодировать,
+        # показываются как ожидающие — их подберут link_places и команда refresh_places
+        located_orders = []
         for order in self:
-            order.distance_error = False
-            order_coordinates = all_places[order.address]
-            for restaurant in order.available_restaurants:
-                restaurant_coordinates = all_places[restaurant.address]
-                if not order_coordinates or not restaurant_coordinates:
-                    order.distance_error = True
-                    break
-                distance_to_client = distance(
-                    restaurant_coordinates,
-                    order_coordinates
-                ).km
-                restaurant.distance_to_client = f'{distance_to_client:0.3f}'
+            order.distance_pending = not order.place_id
+            order.distance_error = bool(order.place_id) and order.place.latitude is None
+            order.restaurants_out_of_range = False
+            if not order.distance_pending and not order.distance_error:
+                located_orders.append(order)
+
+        orders_capable_restaurants = [
+            {candidate.id: candidate for candidate in order.available_restaurants}
+            for order in located_orders
+        ]
+        orders_nearest_restaurants = get_restaurants_index().find_nearest_many([
+            ((order.place.latitude, order.place.longitude), capable_restaurants.keys())
+            for order, capable_restaurants in zip(located_orders, orders_capable_restaurants)
+        ])
+
+        for order, capable_restaurants, nearest_restaurants in zip(
+            located_orders,
+            orders_capable_restaurants,
+            orders_nearest_restaurants,
+        ):
+            order.restaurants_out_of_range = bool(capable_restaurants) and not nearest_restaurants
+            order.available_restaurants = []
+            for restaurant_id, distance_to_client in nearest_restaurants:
+                candidate = capable_restaurants[restaurant_id]
+                candidate.distance_to_client = f'{distance_to_client:0.3f}'
+                order.available_restaurants.append(candidate)
         return self
 
 
@@ -241,6 +367,8 @@ class Order(models.Model):
         ('CANCELED', 'Отменён')
     ]
 
+    ACTIVE_STATUSES = ['NEW', 'PICKING', 'DELIVERING']
+
     PAYMENT_FORMS = [
         ('CASH', 'Наличка'),
         ('CASHLESS', 'Безнал')
@@ -251,6 +379,7 @@ class Order(models.Model):
     lastname = models.CharField('Фамилия', max_length=50)
     phonenumber = PhoneNumberField('Телефон', region='RU', db_index=True)
     created_at = models.DateTimeField('Создан', default=now, db_index=True)
+    updated_at = models.DateTimeField('Изменён', auto_now=True, db_index=True)
     comment = models.TextField('Комментарий', blank=True)
     processed_at = models.DateTimeField(
         'Обработан менеджером',
@@ -272,6 +401,14 @@ class Order(models.Model):
         related_name='orders',
         verbose_name='Ресторан'
     )
+    place = models.ForeignKey(
+        Place,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='orders',
+        verbose_name='Место доставки'
+    )
     status = models.CharField(
         'Статус',
         max_length=10,
@@ -285,20 +422,63 @@ class Order(models.Model):
         choices=PAYMENT_FORMS,
         db_index=True
     )
+    total_cost = models.DecimalField(
+        'Стоимость',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0)]
+    )
     objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='order_board_idx'),
+        ]
 
     def __str__(self):
         return f'Заказ от {self.created_at.strftime("%d.%m.%Y %H:%M:%S")}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем статус из базы, чтобы после сохранения понять, сменился ли он
+        instance.loaded_status = instance.__dict__.get('status')
+        return instance
+
+
+class OrderEvent(models.Model):
+    KINDS = [
+        ('CREATED', 'Заказ создан'),
+        ('STATUS_CHANGED', 'Сменился статус'),
+    ]
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='events',
+        verbose_name='Заказ'
+    )
+    kind = models.CharField('Событие', max_length=20, choices=KINDS)
+    status = models.CharField('Статус', max_length=10, choices=Order.STATUSES)
+    created_at = models.DateTimeField('Создано', default=now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Событие заказа'
+        verbose_name_plural = 'События заказов'
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.order_id}'
+
 
 class Banner(models.Model):
     title = models.CharField('Название', max_length=32)
     src = models.ImageField('Изображение', upload_to='banners/')
+    src_variants = models.JSONField('Уменьшенные копии изображения', default=dict, blank=True, editable=False)
     text = models.CharField('Текст', max_length=100, blank=True, null=True)
     order = models.PositiveIntegerField(default=0, blank=True, null=True, db_index=True)
 
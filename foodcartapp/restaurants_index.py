@@ -0,0 +1,119 @@
+import math
+from collections import defaultdict
+from uuid import uuid4
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from foodcartapp.geo_services import get_distance_matrix
+
+KM_PER_DEGREE = 111.2
+CELL_SIZE_DEGREES = 0.5
+VERSION_CACHE_KEY = 'foodcartapp:restaurants_index_version'
+
+_index = None
+
+
+class RestaurantsIndex:
+    # Рестораны разложены по ячейкам сетки, чтобы искать ближайшие только среди соседних ячеек
+    def __init__(self, restaurants_coordinates, version):
+        self.version = version
+        self.coordinates = restaurants_coordinates
+        self.cells = defaultdict(list)
+        for restaurant_id, coordinates in restaurants_coordinates.items():
+            self.cells[self._get_cell(*coordinates)].append(restaurant_id)
+
+    @staticmethod
+    def _get_cell(latitude, longitude):
+        return math.floor(latitude / CELL_SIZE_DEGREES), math.floor(longitude / CELL_SIZE_DEGREES)
+
+    def _find_candidates(self, coordinates, restaurant_ids, radius_km):
+        latitude, longitude = coordinates
+        latitude_delta = radius_km / KM_PER_DEGREE
+        longitude_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        min_row, min_column = self._get_cell(latitude - latitude_delta, longitude - longitude_delta)
+        max_row, max_column = self._get_cell(latitude + latitude_delta, longitude + longitude_delta)
+
+        return [
+            restaurant_id
+            for row in range(min_row, max_row + 1)
+            for column in range(min_column, max_column + 1)
+            for restaurant_id in self.cells.get((row, column), [])
+            if restaurant_ids is None or restaurant_id in restaurant_ids
+        ]
+
+    def find_nearest(self, coordinates, restaurant_ids=None, count=None, radius_km=None):
+        nearest, = self.find_nearest_many([(coordinates, restaurant_ids)], count, radius_km)
+        return nearest
+
+    def find_nearest_many(self, queries, count=None, radius_km=None):
+        # queries — список пар (координаты, id подходящих ресторанов или None).
+        # Кандидатов каждого запроса берём из соседних ячеек, а расстояния до всех
+        # кандидатов всех запросов считаем одной матрицей
+        if count is None:
+            count = settings.RESTAURANTS_NEAREST_COUNT
+        if radius_km is None:
+            radius_km = settings.RESTAURANTS_SEARCH_RADIUS_KM
+
+        queries_candidates_ids = [
+            self._find_candidates(coordinates, restaurant_ids, radius_km)
+            for coordinates, restaurant_ids in queries
+        ]
+        candidates_ids = sorted(set().union(*queries_candidates_ids))
+        if not candidates_ids:
+            return [[] for _ in queries]
+
+        columns = {restaurant_id: column for column, restaurant_id in enumerate(candidates_ids)}
+        distances = get_distance_matrix(
+            [coordinates for coordinates, _ in queries],
+            [self.coordinates[restaurant_id] for restaurant_id in candidates_ids],
+        )
+
+        # Чужие кандидаты и всё, что дальше радиуса, отсекаем бесконечностью,
+        # после чего ближайшие рестораны каждого запроса — первые столбцы сортировки строки
+        candidates_mask = np.zeros(distances.shape, dtype=bool)
+        for row, query_candidates_ids in enumerate(queries_candidates_ids):
+            query_columns = [columns[restaurant_id] for restaurant_id in query_candidates_ids]
+            candidates_mask[row, query_columns] = True
+        distances = np.where(candidates_mask & (distances <= radius_km), distances, np.inf)
+        nearest_columns = np.argsort(distances, axis=1, kind='stable')[:, :count]
+        nearest_distances = np.take_along_axis(distances, nearest_columns, axis=1)
+
+        queries_nearest = []
+        for row_columns, row_distances in zip(nearest_columns.tolist(), nearest_distances.tolist()):
+            queries_nearest.append([
+                (candidates_ids[column], distance_to_client)
+                for column, distance_to_client in zip(row_columns, row_distances)
+                if distance_to_client != math.inf
+            ])
+        return queries_nearest
+
+
+def get_restaurants_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = invalidate_restaurants_index()
+    return version
+
+
+def get_restaurants_index():
+    global _index
+    version = get_restaurants_version()
+    if _index is None or _index.version != version:
+        Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+        restaurants = Restaurant.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        _index = RestaurantsIndex({
+            restaurant_id: (latitude, longitude)
+            for restaurant_id, latitude, longitude
+            in restaurants.values_list('id', 'latitude', 'longitude')
+        }, version)
+    return _index
+
+
+def invalidate_restaurants_index():
+    # Версия лежит в общем кэше, так что индекс перестроят все воркеры, а не только текущий
+    version = uuid4().hex
+    cache.set(VERSION_CACHE_KEY, version, timeout=None)
+    return version
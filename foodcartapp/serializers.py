@@ -1,16 +1,84 @@
+from django.db import transaction
 from rest_framework import mixins, viewsets
 from rest_framework.fields import IntegerField
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import (
+    ListSerializer,
+    ModelSerializer,
+    SerializerMethodField,
+    ValidationError,
+)
 
-from foodcartapp.models import ProductInCart, Order, Banner
+from foodcartapp.geo_services import run_in_background
+from foodcartapp.images import dump_image_variants
+from foodcartapp.models import Product, ProductInCart, Order, OrderEvent, Banner
+
+ORDERS_BULK_MAX_SIZE = 500
+
+
+def get_products_ids(orders):
+    # Сырые данные ещё не проверены, поэтому всё подозрительное просто пропускаем —
+    # ошибки по таким позициям выдаст валидация конкретного заказа
+    products_ids = set()
+    for order in orders if isinstance(orders, list) else []:
+        products = order.get('products') if isinstance(order, dict) else None
+        for product in products if isinstance(products, list) else []:
+            try:
+                products_ids.add(int(product['product']))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return products_ids
 
 
 class ProductSerializer(ModelSerializer):
+    # Товары всей корзины достаются одним запросом в OrderSerializer.validate_products
+    product = IntegerField(min_value=1)
+
     class Meta:
         model = ProductInCart
         fields = ['product', 'quantity']
 
 
+class OrderListSerializer(ListSerializer):
+    def to_internal_value(self, data):
+        # Товары всех заказов пачки достаются одним запросом, а не по запросу на заказ
+        self.context['products'] = Product.objects.in_bulk(get_products_ids(data))
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        orders = []
+        products_in_cart = []
+        for order_data in validated_data:
+            products = order_data.pop('products')
+            order = Order(**order_data, total_cost=sum(
+                product['product'].price * product['quantity']
+                for product in products
+            ))
+            orders.append(order)
+            products_in_cart.extend(
+                ProductInCart(
+                    product=product['product'],
+                    order=order,
+                    quantity=product['quantity'],
+                    price=product['product'].price
+                )
+                for product in products
+            )
+
+        # bulk_create не шлёт сигналов, поэтому события о создании заказов пишем сами
+        Order.objects.bulk_create(orders)
+        ProductInCart.objects.bulk_create(products_in_cart)
+        OrderEvent.objects.bulk_create(
+            OrderEvent(order=order, kind='CREATED', status=order.status)
+            for order in orders
+        )
+        orders_ids = [order.pk for order in orders]
+        transaction.on_commit(lambda: run_in_background(
+            Order.objects.filter(pk__in=orders_ids).link_places
+        ))
+
+        return orders
+
+
 class OrderSerializer(ModelSerializer):
     products = ProductSerializer(many=True, allow_empty=False, write_only=True)
     id = IntegerField(required=False)
@@ -18,9 +86,34 @@ class OrderSerializer(ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'products', 'firstname', 'lastname', 'phonenumber', 'address']
+        list_serializer_class = OrderListSerializer
+
+    def validate_products(self, products):
+        found_products = self.context.get('products')
+        if found_products is None:
+            found_products = Product.objects.in_bulk(
+                {product['product'] for product in products}
+            )
+        errors = [
+            {} if product['product'] in found_products else {
+                'product': [f'Недопустимый первичный ключ "{product["product"]}" - объект не существует.']
+            }
+            for product in products
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+
+        return [
+            {**product, 'product': found_products[product['product']]}
+            for product in products
+        ]
 
     def create(self, validated_data):
         products = validated_data.pop('products')
+        validated_data['total_cost'] = sum(
+            product['product'].price * product['quantity']
+            for product in products
+        )
         order = super().create(validated_data)
         products_in_cart = [
             ProductInCart(
@@ -32,11 +125,19 @@ class OrderSerializer(ModelSerializer):
             for product in products
         ]
         ProductInCart.objects.bulk_create(products_in_cart)
+        transaction.on_commit(lambda: run_in_background(
+            Order.objects.filter(pk=order.pk).link_places
+        ))
 
         return order
 
 
 class BannerSerializer(ModelSerializer):
+    src_variants = SerializerMethodField()
+
     class Meta:
         model = Banner
-        fields = ['title', 'src', 'text', 'order']
+        fields = ['title', 'src', 'src_variants', 'text', 'order']
+
+    def get_src_variants(self, banner):
+        return dump_image_variants(banner.src_variants)
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from .api_cache import invalidate_api_cache
+from .availability_index import invalidate_availability_index
+from .images import generate_image_variants
+from .models import (
+    Banner,
+    Order,
+    OrderEvent,
+    Product,
+    ProductCategory,
+    ProductInCart,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from .restaurants_index import invalidate_restaurants_index
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def reset_restaurants_index(sender, **kwargs):
+    # Версию меняем только после коммита, иначе другой воркер успеет собрать
+    # индекс по старым данным и сохранить его уже под новой версией
+    transaction.on_commit(invalidate_restaurants_index)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def reset_availability_index(sender, **kwargs):
+    transaction.on_commit(invalidate_availability_index)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_product_availability(sender, instance, **kwargs):
+    products_ids = {instance.product_id, getattr(instance, 'loaded_product_id', None)}
+    Product.objects.filter(pk__in=products_ids - {None}).update_availability()
+    instance.loaded_product_id = instance.product_id
+
+
+@receiver(post_save, sender=Order)
+def log_order_event(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        OrderEvent.objects.create(order=instance, kind='CREATED', status=instance.status)
+    elif instance.status != getattr(instance, 'loaded_status', instance.status):
+        OrderEvent.objects.create(order=instance, kind='STATUS_CHANGED', status=instance.status)
+    instance.loaded_status = instance.status
+
+
+@receiver(post_save, sender=ProductInCart)
+@receiver(post_delete, sender=ProductInCart)
+def touch_order(sender, instance, **kwargs):
+    # Изменение корзины — это изменение заказа, по updated_at сбрасывается кэш строки заказа
+    Order.objects.filter(pk=instance.order_id).update(updated_at=now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def reset_catalog_cache(sender, **kwargs):
+    # Как и с индексами: до коммита новый ответ соберётся из старых данных
+    transaction.on_commit(lambda: invalidate_api_cache('catalog'))
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def reset_banners_cache(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_api_cache('banners'))
+
+
+@receiver(post_save, sender=Product)
+def update_product_image_variants(sender, instance, raw, **kwargs):
+    if raw or not instance.image or instance.image_variants.get('source') == instance.image.name:
+        return
+    try:
+        instance.image_variants = generate_image_variants(instance.image)
+    except (OSError, ValueError):
+        return
+    Product.objects.filter(pk=instance.pk).update(image_variants=instance.image_variants)
+    transaction.on_commit(lambda: invalidate_api_cache('catalog'))
+
+
+@receiver(post_save, sender=Banner)
+def update_banner_image_variants(sender, instance, raw, **kwargs):
+    if raw or not instance.src or instance.src_variants.get('source') == instance.src.name:
+        return
+    try:
+        instance.src_variants = generate_image_variants(instance.src)
+    except (OSError, ValueError):
+        return
+    Banner.objects.filter(pk=instance.pk).update(src_variants=instance.src_variants)
+    transaction.on_commit(lambda: invalidate_api_cache('banners'))
@@ -0,0 +1,21 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from foodcartapp.views import get_storefront_payload
+
+register = template.Library()
+
+SCRIPT_UNSAFE_CHARS = {
+    ord('<'): '\\u003c',
+    ord('>'): '\\u003e',
+    ord('&'): '\\u0026',
+}
+
+
+@register.simple_tag
+def storefront_initial_state():
+    if not settings.STOREFRONT_INLINE_STATE:
+        return ''
+    payload = get_storefront_payload().decode().translate(SCRIPT_UNSAFE_CHARS)
+    return mark_safe(f'<script id="initial-state" type="application/json">{payload}</script>')
@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import product_list_api, banners_list_api, OrderViewSet
+from .views import product_list_api, banners_list_api, bootstrap_api, OrderViewSet
 
 app_name = "foodcartapp"
 
@@ -11,4 +11,5 @@ router.register('order', OrderViewSet, basename='order')
 urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
+    path('bootstrap/', bootstrap_api),
 ] + router.urls
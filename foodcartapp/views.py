@@ -1,25 +1,90 @@
+import json
+
 from django.db import transaction
-from django.http import JsonResponse
-from rest_framework import mixins, viewsets
+from django.http import HttpResponse, HttpResponseBadRequest
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
+from .api_cache import api_condition, get_or_build_api_payload
+from .encoders import dump_json
+from .images import dump_image_variants
 from .models import Product, Banner, Order
-from .serializers import OrderSerializer, BannerSerializer
+from .serializers import ORDERS_BULK_MAX_SIZE, OrderSerializer, BannerSerializer
 
+PRODUCT_FIELDS = [
+    'id',
+    'name',
+    'price',
+    'special_status',
+    'description',
+    'category',
+    'image',
+    'image_variants',
+    'restaurant',
+]
+PRODUCTS_PAGE_MAX_SIZE = 100
 
-def banners_list_api(request):
+
+def dump_banners():
     banners = Banner.objects.all().order_by('order')
-    serialized_banners = [BannerSerializer(banner) for banner in banners]
-    return JsonResponse([
-        serializer.data
-        for serializer in serialized_banners
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return dump_json(BannerSerializer(banners, many=True).data)
 
 
-def product_list_api(request):
-    products = Product.objects.select_related('category').available()
+@api_condition('banners')
+def banners_list_api(request):
+    payload = get_or_build_api_payload('banners', dump_banners)
+    return HttpResponse(payload, content_type='application/json')
+
+
+def parse_products_query(params):
+    query = {
+        'category': None,
+        'special_status': None,
+        'fields': PRODUCT_FIELDS,
+        'cursor': None,
+        'limit': None,
+    }
+    if params.get('category'):
+        query['category'] = int(params['category'])
+    if params.get('special_status'):
+        query['special_status'] = {'true': True, '1': True, 'false': False, '0': False}[
+            params['special_status'].lower()
+        ]
+    if params.get('fields'):
+        fields = params['fields'].split(',')
+        if not set(fields) <= set(PRODUCT_FIELDS):
+            raise ValueError(f'Допустимые поля: {", ".join(PRODUCT_FIELDS)}')
+        query['fields'] = [field for field in PRODUCT_FIELDS if field in fields]
+    if params.get('cursor') or params.get('limit'):
+        query['cursor'] = int(params.get('cursor') or 0)
+        query['limit'] = min(int(params.get('limit') or PRODUCTS_PAGE_MAX_SIZE), PRODUCTS_PAGE_MAX_SIZE)
+        if query['limit'] < 1:
+            raise ValueError('limit должен быть положительным')
+    return query
+
+
+def get_products_cache_key(query):
+    # Ключ строим по разобранному запросу, а не по строке запроса, чтобы лишние
+    # или по-разному записанные параметры не плодили копии одного и того же ответа
+    return json.dumps(query, sort_keys=True)
+
+
+def dump_products(query):
+    products = Product.objects.select_related('category').filter(is_available=True).order_by('id')
+    if query['category'] is not None:
+        products = products.filter(category_id=query['category'])
+    if query['special_status'] is not None:
+        products = products.filter(special_status=query['special_status'])
+    if 'description' not in query['fields']:
+        products = products.defer('description')
+
+    next_cursor = None
+    if query['limit']:
+        products = list(products.filter(id__gt=query['cursor'])[:query['limit'] + 1])
+        if len(products) > query['limit']:
+            products = products[:query['limit']]
+            next_cursor = products[-1].id
 
     dumped_products = []
     for product in products:
@@ -28,22 +93,65 @@ def product_list_api(request):
             'name': product.name,
             'price': product.price,
             'special_status': product.special_status,
-            'description': product.description,
             'category': {
                 'id': product.category.id,
                 'name': product.category.name,
             } if product.category else None,
-            'image': product.image.url,
+            'image': product.image,
+            'image_variants': dump_image_variants(product.image_variants),
             'restaurant': {
                 'id': product.id,
                 'name': product.name,
             }
         }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+        # Описание отложено при выборке, если оно не нужно, и обращаться к нему нельзя
+        if 'description' in query['fields']:
+            dumped_product['description'] = product.description
+        dumped_products.append({field: dumped_product[field] for field in query['fields']})
+    return dump_json(dumped_products), next_cursor
+
+
+def get_storefront_payload():
+    # Всё, что нужно витрине при загрузке: полное меню и баннеры, одним JSON
+    query = parse_products_query({})
+    products_payload, _ = get_or_build_api_payload(
+        'catalog',
+        lambda: dump_products(query),
+        key=get_products_cache_key(query),
+    )
+    banners_payload = get_or_build_api_payload('banners', dump_banners)
+    return b''.join([
+        b'{"products":', products_payload,
+        b',"banners":', banners_payload,
+        b'}',
+    ])
+
+
+@api_condition('catalog', 'banners')
+def bootstrap_api(request):
+    return HttpResponse(get_storefront_payload(), content_type='application/json')
+
+
+@api_condition('catalog')
+def product_list_api(request):
+    try:
+        query = parse_products_query(request.GET)
+    except (KeyError, ValueError) as error:
+        return HttpResponseBadRequest(f'Неверные параметры запроса: {error}')
+
+    # Меню меняется редко, поэтому отдаём заранее сериализованный ответ из кэша
+    payload, next_cursor = get_or_build_api_payload(
+        'catalog',
+        lambda: dump_products(query),
+        key=get_products_cache_key(query),
+    )
+    response = HttpResponse(payload, content_type='application/json')
+    if next_cursor:
+        next_page_params = request.GET.copy()
+        next_page_params['cursor'] = next_cursor
+        next_page_url = request.build_absolute_uri(f'?{next_page_params.urlencode()}')
+        response['Link'] = f'<{next_page_url}>; rel="next"'
+    return response
 
 
 class OrderViewSet(mixins.CreateModelMixin,
@@ -59,3 +167,18 @@ class OrderViewSet(mixins.CreateModelMixin,
         if phonenumber and phonenumber.startswith('8'):
             phonenumber.replace('8', '+7', 1)
         return super().create(request, *args, **kwargs)
+
+    # Пачка заказов от агрегаторов: либо сохраняются все, либо ни одного,
+    # а ошибки возвращаются списком — по элементу на каждый заказ
+    @action(detail=False, methods=['post'], url_path='bulk')
+    @transaction.atomic
+    def bulk_create(self, request):
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=ORDERS_BULK_MAX_SIZE
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
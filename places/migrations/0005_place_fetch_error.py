@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0004_alter_place_latitude_alter_place_longitude'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='fetch_attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Неудачных попыток подряд'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='fetch_error',
+            field=models.CharField(blank=True, choices=[('REQUEST', 'Ошибка запроса к геокодеру'), ('NOT_FOUND', 'Адрес не найден')], max_length=10, verbose_name='Ошибка геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='retry_after',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Повторить попытку после'),
+        ),
+    ]
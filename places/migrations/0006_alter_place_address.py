@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0005_place_fetch_error'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='place',
+            name='address',
+            field=models.CharField(db_index=True, max_length=200, primary_key=True, serialize=False, unique=True, verbose_name='Адрес'),
+        ),
+    ]
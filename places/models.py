@@ -3,11 +3,16 @@ from django.utils.timezone import now
 
 
 class Place(models.Model):
+    FETCH_ERRORS = [
+        ('REQUEST', 'Ошибка запроса к геокодеру'),
+        ('NOT_FOUND', 'Адрес не найден'),
+    ]
+
     latitude = models.FloatField('Долгота', blank=True, null=True)
     longitude = models.FloatField('Широта', blank=True, null=True)
     address = models.CharField(
         'Адрес',
-        max_length=100,
+        max_length=200,
         db_index=True,
         unique=True,
         primary_key=True
@@ -17,6 +22,22 @@ class Place(models.Model):
         default=now,
         db_index=True
     )
+    fetch_error = models.CharField(
+        'Ошибка геокодирования',
+        max_length=10,
+        choices=FETCH_ERRORS,
+        blank=True,
+    )
+    fetch_attempts = models.PositiveIntegerField(
+        'Неудачных попыток подряд',
+        default=0,
+    )
+    retry_after = models.DateTimeField(
+        'Повторить попытку после',
+        blank=True,
+        null=True,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Место'
@@ -0,0 +1,89 @@
+import threading
+from collections import deque
+
+from django.db import DatabaseError, connections
+
+from foodcartapp.models import OrderEvent
+
+POLL_INTERVAL = 2
+POLL_BATCH_SIZE = 100
+RECENT_EVENTS_COUNT = 1000
+
+
+class OrderEventsChannel:
+    # Журнал событий в процессе опрашивает один поток, а открытые вкладки менеджеров
+    # только ждут, пока он разбудит их новыми событиями, и в базу сами не ходят.
+    # Пока подписчиков нет, поток не работает
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.recent_events = deque(maxlen=RECENT_EVENTS_COUNT)
+        self.last_event_id = None
+        self.subscribers_count = 0
+        self.poller = None
+
+    def subscribe(self):
+        with self.condition:
+            self.subscribers_count += 1
+            if self.poller is None:
+                self.poller = threading.Thread(target=self._poll, daemon=True)
+                self.poller.start()
+            self.condition.wait_for(lambda: self.last_event_id is not None, timeout=POLL_INTERVAL * 5)
+            return self.last_event_id or 0
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers_count -= 1
+
+    def wait_for_events(self, last_event_id, timeout):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: (self.last_event_id or 0) > last_event_id,
+                timeout=timeout
+            )
+            return [event for event in self.recent_events if event['id'] > last_event_id]
+
+    def _poll(self):
+        try:
+            while True:
+                with self.condition:
+                    if not self.subscribers_count:
+                        self.poller = None
+                        return
+                    last_event_id = self.last_event_id
+                try:
+                    events = self._fetch_events(last_event_id)
+                except DatabaseError:
+                    # Соединение могло оборваться, на следующем круге откроется новое
+                    connections.close_all()
+                    events = None
+
+                with self.condition:
+                    if last_event_id is None and events is not None:
+                        self.last_event_id = events[-1]['id'] if events else 0
+                    elif events:
+                        self.recent_events.extend(events)
+                        self.last_event_id = events[-1]['id']
+                    self.condition.notify_all()
+                    if events and len(events) == POLL_BATCH_SIZE:
+                        continue
+                    self.condition.wait(POLL_INTERVAL)
+        finally:
+            # Даже если поток упал, следующий подписчик запустит новый
+            with self.condition:
+                if self.poller is threading.current_thread():
+                    self.poller = None
+            connections.close_all()
+
+    @staticmethod
+    def _fetch_events(last_event_id):
+        if last_event_id is None:
+            return list(OrderEvent.objects.order_by('-id').values('id')[:1])
+        return list(
+            OrderEvent.objects
+            .filter(id__gt=last_event_id)
+            .order_by('id')
+            .values('id', 'order', 'kind', 'status')[:POLL_BATCH_SIZE]
+        )
+
+
+order_events_channel = OrderEventsChannel()
@@ -1,3 +1,108 @@
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from foodcartapp.availability_index import get_availability_version
+from foodcartapp.models import Order
+from restaurateur import views
+
+
+def create_orders(count, **fields):
+    return Order.objects.bulk_create(
+        Order(
+            address='Москва, Красная площадь, 1',
+            firstname='Иван',
+            lastname='Иванов',
+            phonenumber='+79161234567',
+            **fields,
+        )
+        for _ in range(count)
+    )
+
+
+class OrdersUpdatesTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+
+    def fetch_updates(self, since, **params):
+        response = self.client.get(reverse('restaurateur:orders_updates'), {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_orders_with_same_updated_at_are_not_skipped(self):
+        updated_at = now() - timedelta(minutes=5)
+        create_orders(views.ORDERS_UPDATES_LIMIT + 50)
+        Order.objects.update(updated_at=updated_at)
+        later_order, = create_orders(1)
+        Order.objects.filter(pk=later_order.pk).update(updated_at=updated_at + timedelta(seconds=1))
+
+        cursor = views.encode_updates_cursor(updated_at - timedelta(seconds=1), 0)
+        delivered_ids = []
+        for _ in range(5):
+            updates = self.fetch_updates(cursor)
+            if not updates['orders']:
+                break
+            delivered_ids.extend(order['id'] for order in updates['orders'])
+            cursor = updates['cursor']
+
+        self.assertCountEqual(delivered_ids, Order.objects.values_list('id', flat=True))
+
+    def test_recent_updates_are_sent_again(self):
+        order, = create_orders(1)
+        Order.objects.filter(pk=order.pk).update(updated_at=now() - timedelta(seconds=3))
+        cursor = views.encode_updates_cursor(now() - timedelta(minutes=1), 0)
+
+        updates = self.fetch_updates(cursor)
+        self.assertEqual([order['id'] for order in updates['orders']], [order.id])
+
+        # Транзакция с этим заказом могла закоммититься позже, поэтому курсор его не перешагивает
+        updates = self.fetch_updates(updates['cursor'])
+        self.assertEqual([order['id'] for order in updates['orders']], [order.id])
+
+    def test_orders_outside_page_are_not_visible(self):
+        create_orders(2)
+        Order.objects.update(updated_at=now() - timedelta(minutes=1))
+
+        with mock.patch.object(views, 'ORDERS_PAGE_SIZE', 1):
+            response = self.client.get(reverse('restaurateur:view_orders'))
+        first_page_end = views.encode_orders_cursor(Order.objects.filter_active().first())
+        self.assertIn(urlencode({'until': first_page_end}), response.context['updates_query'])
+
+        cursor = views.encode_updates_cursor(now() - timedelta(minutes=5), 0)
+        updates = self.fetch_updates(cursor, until=first_page_end)
+        visible_ids = [order['id'] for order in updates['orders'] if order['visible']]
+        self.assertEqual(visible_ids, [Order.objects.filter_active().first().id])
+
+        updates = self.fetch_updates(cursor, cursor=first_page_end)
+        visible_ids = [order['id'] for order in updates['orders'] if order['visible']]
+        self.assertEqual(visible_ids, [Order.objects.filter_active()[1].id])
+
+
+class OrdersPageTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+
+    def test_order_saved_while_rendering_page(self):
+        order, = create_orders(1)
+
+        def save_order():
+            Order.objects.filter(pk=order.pk).update(updated_at=now())
+            return get_availability_version()
+
+        with mock.patch.object(views, 'get_availability_version', save_order):
+            response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'data-order-id="{order.id}"')
 
-# Create your tests here.
+    def test_edit_link_follows_current_page(self):
+        order, = create_orders(1)
+        self.client.get(reverse('restaurateur:view_orders'))
+        response = self.client.get(reverse('restaurateur:view_orders'), {'status': 'NEW'})
+        self.assertContains(response, f'/admin/foodcartapp/order/{order.id}/change/?next=/manager/orders/%3Fstatus%3DNEW')
@@ -13,6 +13,8 @@ urlpatterns = [
     path('restaurants/', views.view_restaurants, name="RestaurantView"),
 
     path('orders/', views.view_orders, name="view_orders"),
+    path('orders/updates/', views.view_orders_updates, name="orders_updates"),
+    path('orders/events/', views.view_orders_events, name="orders_events"),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
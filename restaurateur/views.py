@@ -1,13 +1,36 @@
+import json
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
 from django import forms
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.utils.timezone import now
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Q
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 
+from foodcartapp.availability_index import get_availability_version
 from foodcartapp.models import Product, Restaurant, Order
+from foodcartapp.restaurants_index import get_restaurants_version
+from restaurateur.order_events import order_events_channel
+
+ORDERS_PAGE_SIZE = 50
+ORDERS_UPDATES_LIMIT = 100
+ORDERS_UPDATES_OVERLAP = timedelta(seconds=10)
+ORDERS_EVENTS_RETRY_INTERVAL = 2
+ORDERS_EVENTS_HEARTBEAT_INTERVAL = 15
+ORDERS_EVENTS_STREAM_DURATION = 300
+ORDER_ROW_CACHE_TIMEOUT = 60 * 60 * 24
 
 
 class Login(forms.Form):
@@ -89,11 +112,248 @@ def view_restaurants(request):
     })
 
 
+def encode_orders_cursor(order):
+    cursor = f'{order.status}|{order.created_at.isoformat()}|{order.id}'
+    return urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_orders_cursor(cursor):
+    try:
+        status, created_at, order_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return status, datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        return None
+
+
+def encode_updates_cursor(updated_at, order_id):
+    cursor = f'{updated_at.isoformat()}|{order_id}'
+    return urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_updates_cursor(cursor):
+    try:
+        updated_at, order_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(updated_at), int(order_id)
+    except ValueError:
+        return None
+
+
+def get_orders_filters(request):
+    return {
+        'status': request.GET.get('status', ''),
+        'restaurant': request.GET.get('restaurant', ''),
+        'payment': request.GET.get('payment', ''),
+    }
+
+
+def filter_orders(orders, filters):
+    if filters['status'] in Order.ACTIVE_STATUSES:
+        orders = orders.filter(status=filters['status'])
+    if filters['restaurant'].isdigit():
+        orders = orders.filter(restaurant_id=filters['restaurant'])
+    if filters['payment'] in dict(Order.PAYMENT_FORMS):
+        orders = orders.filter(payment=filters['payment'])
+    return orders
+
+
+def get_order_row_cache_key(order, versions):
+    return f'order_row:{order.id}:{order.updated_at.timestamp()}:{versions}'
+
+
+def get_orders_rows(orders, current_url, request):
+    # Строка заказа зависит от самого заказа, наличия блюд в ресторанах и адресов ресторанов.
+    # Пока ничего из этого не менялось, ячейки строки берутся из кэша без подбора ресторанов.
+    # Ссылка на редактирование зависит от текущей страницы и в кэш не попадает
+    versions = f'{get_availability_version()}:{get_restaurants_version()}'
+    orders_keys = {
+        order.id: get_order_row_cache_key(order, versions)
+        for order in orders
+    }
+    cached_rows = caches['fragments'].get_many(orders_keys.values())
+
+    missed_orders_ids = [
+        order_id for order_id, key in orders_keys.items()
+        if key not in cached_rows
+    ]
+    if missed_orders_ids:
+        missed_orders = Order.objects.filter(pk__in=missed_orders_ids). \
+            select_related('place', 'restaurant'). \
+            get_available_restaurants(). \
+            get_distances_to_client()
+        # Ключи берём из первой выборки: заказ могли изменить между запросами,
+        # тогда строка по его новому updated_at просто пересоберётся в следующий раз
+        new_rows = {}
+        for order in missed_orders:
+            new_rows[orders_keys[order.id]] = {
+                'cells': render_to_string('order_cells.html', {'order': order}, request=request),
+                'restaurants': [
+                    {
+                        'id': candidate.id,
+                        'name': candidate.name,
+                        'distance_to_client': candidate.distance_to_client,
+                    }
+                    for candidate in order.available_restaurants
+                ],
+            }
+        caches['fragments'].set_many(new_rows, ORDER_ROW_CACHE_TIMEOUT)
+        cached_rows.update(new_rows)
+
+    return {
+        order_id: {
+            'html': render_to_string('order_row.html', {
+                'order_id': order_id,
+                'cells': cached_rows[key]['cells'],
+                'current_url': current_url,
+            }),
+            'restaurants': cached_rows[key]['restaurants'],
+        }
+        for order_id, key in orders_keys.items()
+        if key in cached_rows
+    }
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders = Order.objects.filter_active().get_available_restaurants().get_distances_to_client()
+    # Курсор для обновлений берём до выборки, чтобы не пропустить изменения, сделанные во время неё.
+    # updated_at ставится при сохранении, а не при коммите, поэтому курсор отстаёт от текущего
+    # времени на ORDERS_UPDATES_OVERLAP: заказы из ещё не закоммиченных транзакций придут позже
+    updates_cursor = encode_updates_cursor(now() - ORDERS_UPDATES_OVERLAP, 0)
+    filters = get_orders_filters(request)
+    orders = filter_orders(Order.objects.filter_active(), filters)
+
+    # Границы страницы передаём и в обновления, чтобы на странице появлялись только её заказы
+    page_bounds = {}
+    cursor = decode_orders_cursor(request.GET.get('cursor', ''))
+    if cursor:
+        orders = orders.filter_after(*cursor)
+        page_bounds['cursor'] = request.GET['cursor']
+
+    # Берём на один заказ больше, чтобы узнать, есть ли следующая страница
+    orders = list(orders[:ORDERS_PAGE_SIZE + 1])
+    next_page_url = None
+    if len(orders) > ORDERS_PAGE_SIZE:
+        orders = orders[:ORDERS_PAGE_SIZE]
+        page_bounds['until'] = encode_orders_cursor(orders[-1])
+        next_page_url = '?' + urlencode({
+            **filters,
+            'cursor': page_bounds['until'],
+        })
+
+    current_url = request.get_full_path()
+    orders_rows = get_orders_rows(orders, current_url, request)
     context = {
-        'orders': orders,
-        'current_url': request.path
+        'orders_rows': [
+            orders_rows[order.id]['html']
+            for order in orders
+            if order.id in orders_rows
+        ],
+        'filters': filters,
+        'updates_query': urlencode({**filters, **page_bounds}),
+        'statuses': [
+            (status, name) for status, name in Order.STATUSES
+            if status in Order.ACTIVE_STATUSES
+        ],
+        'payment_forms': Order.PAYMENT_FORMS,
+        'restaurants': Restaurant.objects.order_by('name').only('id', 'name'),
+        'next_page_url': next_page_url,
+        'first_page_url': '?' + urlencode(filters),
+        'updates_cursor': updates_cursor,
     }
     return render(request, template_name='order_items.html', context=context)
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders_updates(request):
+    since = decode_updates_cursor(request.GET.get('since', ''))
+    if not since:
+        return HttpResponseBadRequest('Не передан курсор since')
+    since_updated_at, since_order_id = since
+
+    # Курсор составной, как у страниц заказов: заказов с одинаковым updated_at
+    # бывает больше, чем влезает в один ответ, например после массового update().
+    # Недавние изменения отдаём повторно, пока курсор их не перерастёт, —
+    # клиент просто заменит строки заказов ещё раз
+    max_cursor = now() - ORDERS_UPDATES_OVERLAP
+    changed_orders = list(
+        Order.objects
+        .filter(
+            Q(updated_at__gt=since_updated_at)
+            | Q(updated_at=since_updated_at, id__gt=since_order_id)
+        )
+        .only('id', 'status', 'updated_at')
+        .order_by('updated_at', 'id')[:ORDERS_UPDATES_LIMIT]
+    )
+
+    page_orders = filter_orders(Order.objects.filter_active(), get_orders_filters(request))
+    page_start = decode_orders_cursor(request.GET.get('cursor', ''))
+    if page_start:
+        page_orders = page_orders.filter_after(*page_start)
+    page_end = decode_orders_cursor(request.GET.get('until', ''))
+    if page_end:
+        page_orders = page_orders.filter_until(*page_end)
+    visible_orders = list(page_orders.filter(pk__in=[order.id for order in changed_orders]))
+    current_url = request.GET.get('next', reverse('restaurateur:view_orders'))
+    orders_rows = get_orders_rows(visible_orders, current_url, request)
+
+    orders_updates = []
+    for order in changed_orders:
+        order_update = {
+            'id': order.id,
+            'status': order.status,
+            'visible': order.id in orders_rows,
+        }
+        if order.id in orders_rows:
+            order_update.update(orders_rows[order.id])
+        orders_updates.append(order_update)
+
+    if not changed_orders:
+        cursor = since
+    elif changed_orders[-1].updated_at <= max_cursor:
+        cursor = changed_orders[-1].updated_at, changed_orders[-1].id
+    else:
+        cursor = max(since, (max_cursor, 0))
+    return JsonResponse({
+        'cursor': encode_updates_cursor(*cursor),
+        'orders': orders_updates,
+    })
+
+
+def stream_order_events(last_event_id):
+    # Соединение с базой, открытое при проверке пользователя, потоку больше не нужно
+    connections.close_all()
+    channel_last_event_id = order_events_channel.subscribe()
+    if last_event_id is None:
+        last_event_id = channel_last_event_id
+
+    try:
+        started_at = time.monotonic()
+        while time.monotonic() - started_at < ORDERS_EVENTS_STREAM_DURATION:
+            events = order_events_channel.wait_for_events(
+                last_event_id,
+                timeout=ORDERS_EVENTS_HEARTBEAT_INTERVAL
+            )
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+            for event in events:
+                last_event_id = event['id']
+                yield f'id: {last_event_id}\nevent: order\ndata: {json.dumps(event)}\n\n'
+
+        # Браузер сам переподключится и передаст id последнего события в Last-Event-ID
+        yield f'retry: {ORDERS_EVENTS_RETRY_INTERVAL * 1000}\n\n'
+    finally:
+        order_events_channel.unsubscribe()
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders_events(request):
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+
+    response = StreamingHttpResponse(
+        stream_order_events(last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 import dj_database_url
 
@@ -12,7 +13,14 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', False)
+API_PRETTY_JSON = env.bool('API_PRETTY_JSON', DEBUG)
+STOREFRONT_INLINE_STATE = env.bool('STOREFRONT_INLINE_STATE', True)
 GEOCODER_API_KEY = env('GEOCODER_API_KEY')
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 8)
+DISTANCE_GEODESIC = env.bool('DISTANCE_GEODESIC', False)
+RESTAURANTS_SEARCH_RADIUS_KM = env.float('RESTAURANTS_SEARCH_RADIUS_KM', 50)
+RESTAURANTS_NEAREST_COUNT = env.int('RESTAURANTS_NEAREST_COUNT', 5)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', ['127.0.0.1', 'localhost'], delimiter=',')
 
@@ -90,6 +98,25 @@ DATABASES = {
     )
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'star_burger_cache')),
+    },
+    # Строки заказов и готовые ответы API. Их много, и при переполнении кэш выкидывает
+    # случайные записи, поэтому они лежат отдельно от версий индексов и API в default
+    'fragments': {
+        'BACKEND': env('FRAGMENTS_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': env(
+            'FRAGMENTS_CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'star_burger_fragments'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('FRAGMENTS_CACHE_MAX_ENTRIES', 10000),
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',